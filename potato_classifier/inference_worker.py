@@ -0,0 +1,127 @@
+"""
+Background micro-batching for ONNX inference.
+
+Requests submit a single preprocessed image and get a Future back. One worker
+thread drains the queue, stacks whatever is waiting into a single batch and
+runs the model once for all of them.
+"""
+
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+from django.conf import settings
+
+from .utils import (
+    get_session,
+    run_batch_inference,
+    validate_input_shape,
+    warm_up_session,
+)
+
+_QUEUE = queue.Queue()
+_WORKER = None
+_WORKER_LOCK = threading.Lock()
+
+
+def _reset_after_fork():
+    """
+    Give a forked child (e.g. a pre-forked server worker) its own queue and worker.
+    The parent's worker thread doesn't exist in the child but is still registered
+    as a waiter on the inherited queue, so a put() there could wake nobody.
+    """
+    global _QUEUE, _WORKER, _WORKER_LOCK
+    _QUEUE = queue.Queue()
+    _WORKER = None
+    _WORKER_LOCK = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _collect_batch():
+    """
+    Block for the first item, then take whatever else is already queued.
+    There is no timer: requests that arrive while a batch is running queue up
+    and form the next batch, so a lone request never waits for partners.
+    """
+    items = [_QUEUE.get()]
+
+    # A model exported with a fixed batch size can't take stacked inputs
+    fixed_batch_size = get_session().resolved_shape[0]
+    max_batch_size = fixed_batch_size or settings.INFERENCE_MAX_BATCH_SIZE
+
+    while len(items) < max_batch_size:
+        try:
+            items.append(_QUEUE.get_nowait())
+        except queue.Empty:
+            break
+    return items
+
+
+def _worker_loop():
+    while True:
+        items = _collect_batch()
+        try:
+            if len(items) == 1:
+                batch = items[0][0]
+            else:
+                batch = np.concatenate(
+                    [image_array for image_array, _ in items], axis=0
+                )
+            predictions = run_batch_inference(batch)
+        except Exception as e:
+            error = ValueError(f"❌ Error during ONNX inference: {str(e)}")
+            for _, future in items:
+                future.set_exception(error)
+            continue
+
+        for i, (_, future) in enumerate(items):
+            future.set_result(predictions[i])
+
+
+def start_worker():
+    """Start the inference worker thread if it isn't running yet"""
+    global _WORKER
+    with _WORKER_LOCK:
+        if _WORKER is None or not _WORKER.is_alive():
+            _WORKER = threading.Thread(
+                target=_worker_loop, name="onnx-inference-worker", daemon=True
+            )
+            _WORKER.start()
+
+
+def warm_up():
+    """
+    Load the model and run one dummy inference, so the first request doesn't
+    pay for it. Called from the WSGI/ASGI entry points only; management
+    commands fall back to loading lazily on first use. The worker thread is
+    left to submit(), so a pre-forking server's master never starts one.
+    """
+    if not os.path.exists(settings.MODEL_PATH):
+        return
+
+    try:
+        warm_up_session()
+    except Exception as e:
+        print(f"⚠️ Could not warm up ONNX session: {str(e)}")
+
+
+def submit(image_array):
+    """
+    Queue a single (1, H, W, C) image for batched inference.
+    Returns a Future that resolves to the prediction vector for that image.
+    """
+    future = Future()
+    try:
+        validate_input_shape(get_session(), image_array)
+    except Exception as e:
+        future.set_exception(ValueError(f"❌ Error during ONNX inference: {str(e)}"))
+        return future
+
+    start_worker()
+    _QUEUE.put((image_array, future))
+    return future
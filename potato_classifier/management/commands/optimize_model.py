@@ -0,0 +1,250 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import onnxruntime as ort
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from potato_classifier.utils import decode_and_preprocess
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def convert_float16_to_float32(model):
+    """
+    Rewrite a float16 ONNX graph as float32.
+    The quantizer only calibrates float32 tensors, so the fp16 export has to be
+    widened first; the leftover fp32->fp32 Casts are folded away by ORT.
+    """
+    from onnx import TensorProto, numpy_helper
+
+    def widen_tensor(tensor):
+        if tensor.data_type == TensorProto.FLOAT16:
+            array = numpy_helper.to_array(tensor).astype(np.float32)
+            tensor.CopyFrom(numpy_helper.from_array(array, tensor.name))
+
+    def widen_value_info(value_info):
+        tensor_type = value_info.type.tensor_type
+        if tensor_type.elem_type == TensorProto.FLOAT16:
+            tensor_type.elem_type = TensorProto.FLOAT
+
+    graph = model.graph
+    for initializer in graph.initializer:
+        widen_tensor(initializer)
+
+    for node in graph.node:
+        for attr in node.attribute:
+            if node.op_type == "Cast" and attr.name == "to":
+                if attr.i == TensorProto.FLOAT16:
+                    attr.i = TensorProto.FLOAT
+            if attr.HasField("t"):
+                widen_tensor(attr.t)
+
+    for value_info in list(graph.input) + list(graph.output) + list(graph.value_info):
+        widen_value_info(value_info)
+
+    return model
+
+
+class ImageCalibrationReader:
+    """Feed real images through the same preprocessing used at inference time"""
+
+    def __init__(self, image_paths, input_name, target_size):
+        self.image_paths = iter(image_paths)
+        self.input_name = input_name
+        self.target_size = target_size
+
+    def get_next(self):
+        image_path = next(self.image_paths, None)
+        if image_path is None:
+            return None
+        with open(image_path, "rb") as image_file:
+            image_array, _, _, _, _ = decode_and_preprocess(
+                image_file, self.target_size
+            )
+        # decode_and_preprocess reuses its output buffer, so keep a copy
+        return {self.input_name: image_array.copy()}
+
+    def rewind(self):
+        pass
+
+
+def compare_models(reference_path, candidate_path, image_paths, target_size):
+    """
+    Run both models on the same images.
+    Returns (top-1 agreements, number of images, max absolute probability difference).
+    """
+    reference = ort.InferenceSession(reference_path, providers=["CPUExecutionProvider"])
+    candidate = ort.InferenceSession(candidate_path, providers=["CPUExecutionProvider"])
+    input_name = reference.get_inputs()[0].name
+    reader = ImageCalibrationReader(image_paths, input_name, target_size)
+
+    agreements = 0
+    max_difference = 0.0
+    while (inputs := reader.get_next()) is not None:
+        expected = reference.run(None, inputs)[0][0]
+        actual = candidate.run(None, inputs)[0][0]
+        agreements += int(np.argmax(expected) == np.argmax(actual))
+        max_difference = max(max_difference, float(np.abs(expected - actual).max()))
+    return agreements, len(image_paths), max_difference
+
+
+class Command(BaseCommand):
+    help = (
+        "Optimize the ONNX model graph offline and quantize it to INT8. "
+        "Requires the 'onnx' package. Uses static (QDQ) quantization calibrated on "
+        "real images, or weights-only dynamic quantization with --dynamic, and "
+        "reports top-1 agreement with the fp32 model on those images. The result "
+        "is only served once MODEL_PATH points at it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--input",
+            default=os.path.join(
+                settings.BASE_DIR, "models", "potato_disease_float16.onnx"
+            ),
+            help="Source ONNX model",
+        )
+        parser.add_argument(
+            "--output",
+            default=settings.QUANTIZED_MODEL_PATH,
+            help="Destination for the quantized model",
+        )
+        parser.add_argument(
+            "--calibration-dir",
+            required=True,
+            help=(
+                "Directory of real potato images (20-100) used for static "
+                "quantization and to check the result against the fp32 model"
+            ),
+        )
+        parser.add_argument(
+            "--dynamic",
+            action="store_true",
+            help=(
+                "Use weights-only dynamic quantization instead of static. Usually "
+                "slower and less accurate than static quantization for this CNN."
+            ),
+        )
+        parser.add_argument(
+            "--max-calibration-images",
+            type=int,
+            default=100,
+            help="Maximum number of calibration images to use",
+        )
+        parser.add_argument(
+            "--fix-batch-size",
+            action="store_true",
+            help=(
+                "Freeze the batch dimension to 1 so every input shape is static. "
+                "This disables micro-batching of concurrent requests."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        try:
+            import onnx
+            from onnxruntime.quantization import (
+                CalibrationMethod,
+                QuantFormat,
+                QuantType,
+                quantize_dynamic,
+                quantize_static,
+            )
+        except ImportError:
+            raise CommandError("The 'onnx' package is required: pip install onnx")
+
+        if not os.path.exists(options["input"]):
+            raise CommandError(f"Model file not found: {options['input']}")
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # Step 1: Widen the fp16 export to fp32 so it can be quantized
+            fp32_path = os.path.join(tmp_dir, "model_fp32.onnx")
+            model = convert_float16_to_float32(onnx.load(options["input"]))
+            if options["fix_batch_size"]:
+                from onnxruntime.tools.onnx_model_utils import (
+                    fix_output_shapes,
+                    make_input_shape_fixed,
+                )
+
+                width, height = settings.TARGET_IMAGE_SIZE
+                make_input_shape_fixed(
+                    model.graph, model.graph.input[0].name, [1, height, width, 3]
+                )
+                fix_output_shapes(model)
+            onnx.save(model, fp32_path)
+
+            # Step 2: Let ORT fold constants and fuse Conv/BN/activation nodes.
+            # Layout-specific optimizations are left to the runtime session.
+            optimized_path = os.path.join(tmp_dir, "model_optimized.onnx")
+            so = ort.SessionOptions()
+            so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_BASIC
+            so.optimized_model_filepath = optimized_path
+            session = ort.InferenceSession(
+                fp32_path, sess_options=so, providers=["CPUExecutionProvider"]
+            )
+            input_name = session.get_inputs()[0].name
+            del session
+
+            # Step 3: Quantize
+            image_paths = sorted(
+                os.path.join(options["calibration_dir"], name)
+                for name in os.listdir(options["calibration_dir"])
+                if name.lower().endswith(IMAGE_EXTENSIONS)
+            )[: options["max_calibration_images"]]
+            if not image_paths:
+                raise CommandError("No calibration images found.")
+
+            quantized_path = os.path.join(tmp_dir, "model_int8.onnx")
+            if options["dynamic"]:
+                self.stdout.write("Dynamic INT8 quantization (weights only)")
+                quantize_dynamic(
+                    optimized_path,
+                    quantized_path,
+                    weight_type=QuantType.QUInt8,
+                    per_channel=True,
+                )
+            else:
+                self.stdout.write(
+                    f"Static INT8 quantization with {len(image_paths)} calibration images"
+                )
+                quantize_static(
+                    optimized_path,
+                    quantized_path,
+                    ImageCalibrationReader(
+                        image_paths, input_name, settings.TARGET_IMAGE_SIZE
+                    ),
+                    quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8,
+                    weight_type=QuantType.QInt8,
+                    per_channel=True,
+                    calibrate_method=CalibrationMethod.MinMax,
+                )
+
+            # Step 4: Check the quantized model against the fp32 model
+            agreements, total, max_difference = compare_models(
+                optimized_path,
+                quantized_path,
+                image_paths,
+                settings.TARGET_IMAGE_SIZE,
+            )
+            style = self.style.SUCCESS if agreements == total else self.style.WARNING
+            self.stdout.write(
+                style(
+                    f"Top-1 agreement with fp32: {agreements}/{total} "
+                    f"({agreements / total:.1%}), max probability difference "
+                    f"{max_difference:.4f}"
+                )
+            )
+
+            shutil.move(quantized_path, options["output"])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Quantized model saved to {options['output']}. "
+                f"Set MODEL_PATH to serve it."
+            )
+        )
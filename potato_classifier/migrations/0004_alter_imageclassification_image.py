@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-15 18:11
+
+import cloudinary.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("potato_classifier", "0003_alter_imageclassification_options_and_more"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="imageclassification",
+            name="image",
+            field=cloudinary.models.CloudinaryField(
+                blank=True, max_length=255, null=True, verbose_name="image"
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-15 18:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("potato_classifier", "0004_alter_imageclassification_image"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="imageclassification",
+            index=models.Index(fields=["-created_at"], name="imgcls_created_at_idx"),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-15 18:12
+
+import uuid6
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("potato_classifier", "0005_imageclassification_imgcls_created_at_idx"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="imageclassification",
+            name="id",
+            field=models.UUIDField(
+                default=uuid6.uuid7, editable=False, primary_key=True, serialize=False
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="imageclassification",
+            index=models.Index(
+                fields=["predicted_class"], name="imgcls_predicted_class_idx"
+            ),
+        ),
+    ]
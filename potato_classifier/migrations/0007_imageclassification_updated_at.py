@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-15 18:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("potato_classifier", "0006_alter_imageclassification_id_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="imageclassification",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name="imageclassification",
+            index=models.Index(fields=["updated_at"], name="imgcls_updated_at_idx"),
+        ),
+    ]
@@ -1,11 +1,14 @@
 from django.db import models
 from cloudinary.models import CloudinaryField
-import uuid
+import uuid6
 
 
 class ImageClassification(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    image = CloudinaryField("image", folder="potato_classifications/")
+    # UUIDv7 ids are time-ordered, so new rows append to the primary key index
+    id = models.UUIDField(primary_key=True, default=uuid6.uuid7, editable=False)
+    image = CloudinaryField(
+        "image", folder="potato_classifications/", null=True, blank=True
+    )
     predicted_class = models.CharField(max_length=50)
     confidence = models.FloatField()
     all_predictions = models.JSONField()
@@ -18,9 +21,16 @@ class ImageClassification(models.Model):
         max_length=20, null=True, blank=True, help_text="Original image dimensions"
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped whenever the row changes, including when its image upload is attached
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["-created_at"], name="imgcls_created_at_idx"),
+            models.Index(fields=["predicted_class"], name="imgcls_predicted_class_idx"),
+            models.Index(fields=["updated_at"], name="imgcls_updated_at_idx"),
+        ]
         verbose_name = "Image Classification"
         verbose_name_plural = "Image Classifications"
 
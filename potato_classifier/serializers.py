@@ -37,8 +37,52 @@ class ImageClassificationSerializer(serializers.ModelSerializer):
         ]
 
 
+class ImageClassificationListSerializer(serializers.ModelSerializer):
+    """Slim serializer for history listings, without the per-class JSON fields"""
+
+    image_url = serializers.URLField(read_only=True)
+    confidence_percentage = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = ImageClassification
+        fields = [
+            "id",
+            "image",
+            "image_url",
+            "predicted_class",
+            "confidence",
+            "confidence_percentage",
+            "is_preprocessed",
+            "processing_time",
+            "image_size",
+            "created_at",
+        ]
+        read_only_fields = fields
+
+
+IMAGE_CONTENT_TYPES = {
+    "image/jpeg": "JPEG",
+    "image/jpg": "JPEG",
+    "image/png": "PNG",
+    "image/webp": "WEBP",
+}
+
+
+def sniff_image_format(header):
+    """Identify JPEG, PNG or WebP from the first 12 bytes of a file"""
+    if header.startswith(b"\xff\xd8\xff"):
+        return "JPEG"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "PNG"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "WEBP"
+    return None
+
+
 class ImageUploadSerializer(serializers.Serializer):
-    image = serializers.ImageField(
+    # A plain FileField: ImageField would have PIL parse the whole upload just to
+    # validate it, and the image is fully decoded again for classification anyway.
+    image = serializers.FileField(
         help_text="Upload a potato plant image for disease classification. Supported formats: JPEG, PNG, WebP. Max size: 10MB"
     )
 
@@ -49,13 +93,18 @@ class ImageUploadSerializer(serializers.Serializer):
                 "Image file too large. Maximum size is 10MB."
             )
 
-        # Validate file format
+        # Validate file format from the declared type and the file's magic bytes
         allowed_formats = ["JPEG", "PNG", "WEBP", "JPG"]
-        if hasattr(value, "image"):
-            if value.image.format not in allowed_formats:
-                raise serializers.ValidationError(
-                    f"Unsupported image format. Allowed formats: {', '.join(allowed_formats)}"
-                )
+        header = value.read(12)
+        value.seek(0)
+        image_format = sniff_image_format(header)
+        if (
+            image_format is None
+            or IMAGE_CONTENT_TYPES.get(value.content_type) != image_format
+        ):
+            raise serializers.ValidationError(
+                f"Unsupported image format. Allowed formats: {', '.join(allowed_formats)}"
+            )
 
         return value
 
@@ -71,5 +120,6 @@ class ClassificationResultSerializer(serializers.Serializer):
     recommendations = serializers.ListField(child=serializers.CharField())
     is_preprocessed = serializers.BooleanField()
     processing_time = serializers.FloatField()
-    image_url = serializers.URLField()
+    image_url = serializers.URLField(allow_null=True)
+    detail_url = serializers.URLField()
     message = serializers.CharField()
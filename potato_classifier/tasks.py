@@ -0,0 +1,114 @@
+"""
+Background work that doesn't need to hold up the classification response.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from cloudinary import uploader
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.utils import timezone
+
+from .models import ImageClassification
+from .utils import encode_archive_jpeg
+
+upload_executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_UPLOAD_WORKERS, thread_name_prefix="cloudinary-upload"
+)
+
+
+def _upload_options():
+    """The upload options CloudinaryField applies on save (e.g. folder)"""
+    field = ImageClassification._meta.get_field("image")
+    options = {"type": field.type, "resource_type": field.resource_type}
+    options.update(field.options)
+    return options
+
+
+def _upload_image(classification_id, archive_image):
+    """Encode the archive image and upload it to Cloudinary"""
+    image_bytes = encode_archive_jpeg(
+        archive_image, quality=settings.ARCHIVE_IMAGE_QUALITY
+    )
+    options = _upload_options()
+    return uploader.upload_resource(
+        SimpleUploadedFile(f"{classification_id}.jpg", image_bytes, "image/jpeg"),
+        **options,
+    )
+
+
+def _attach_image(classification_id, upload_future):
+    """Store a finished upload on its saved classification"""
+    try:
+        # update() skips auto_now, so bump updated_at for the history ETag
+        ImageClassification.objects.filter(id=classification_id).update(
+            image=upload_future.result(), updated_at=timezone.now()
+        )
+    except Exception as e:
+        print(
+            f"❌ Error uploading image for classification {classification_id}: {str(e)}"
+        )
+    finally:
+        connection.close()
+
+
+def _destroy_image(upload_future):
+    """Delete an upload whose classification was never saved"""
+    if upload_future.cancelled() or upload_future.exception() is not None:
+        return
+    resource = upload_future.result()
+    options = _upload_options()
+    try:
+        uploader.destroy(
+            resource.public_id,
+            resource_type=options["resource_type"],
+            type=options["type"],
+        )
+    except Exception as e:
+        print(f"❌ Error deleting orphaned image {resource.public_id}: {str(e)}")
+
+
+def _run_after_upload(upload_future, callback):
+    """Run callback(upload_future) once the upload finishes, off the request thread"""
+    caller = threading.current_thread()
+
+    def on_done(future):
+        if threading.current_thread() is caller:
+            # Already finished: don't block or close the request thread's DB connection
+            upload_executor.submit(callback, future)
+        else:
+            # Running on the upload thread, which may be draining at shutdown
+            callback(future)
+
+    upload_future.add_done_callback(on_done)
+
+
+def start_image_upload(classification_id, archive_image):
+    """
+    Start uploading a classification's image to Cloudinary.
+    This can run while inference is still in progress, before the row exists.
+    archive_image is the downsized RGB copy from decode_and_preprocess, so only
+    that small array waits in the executor queue; it is archived as a JPEG
+    rather than the original upload, which is discarded once the request finishes.
+    """
+    return upload_executor.submit(_upload_image, classification_id, archive_image)
+
+
+def attach_image_when_uploaded(classification_id, upload_future):
+    """Once the classification is saved, attach its image as soon as the upload finishes"""
+    _run_after_upload(
+        upload_future, lambda future: _attach_image(classification_id, future)
+    )
+
+
+def discard_image_upload(upload_future):
+    """
+    Abandon an upload for a classification that failed before it was saved.
+    A queued upload is cancelled; one already running is deleted from
+    Cloudinary once it finishes, so it doesn't linger unreferenced.
+    """
+    if upload_future is None or upload_future.cancel():
+        return
+    _run_after_upload(upload_future, _destroy_image)
@@ -1,3 +1,310 @@
-from django.test import TestCase
+import io
+import os
+import threading
+import unittest
+from concurrent.futures import Future
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from cloudinary import CloudinaryResource
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image, ImageOps
+
+from .inference_worker import start_worker, submit, warm_up
+from .models import ImageClassification
+from .serializers import ImageUploadSerializer, sniff_image_format
+from .tasks import _attach_image, discard_image_upload
+from .utils import _to_probabilities, decode_and_preprocess, run_onnx_inference
+
+
+@unittest.skipUnless(os.path.exists(settings.MODEL_PATH), "ONNX model not available")
+class InferenceWorkerTests(SimpleTestCase):
+    def test_batched_results_match_single_image_inference(self):
+        rng = np.random.default_rng(0)
+        width, height = settings.TARGET_IMAGE_SIZE
+        images = [rng.random((1, height, width, 3), dtype=np.float32) for _ in range(8)]
+
+        # Queue every image before waiting so the worker stacks them into batches
+        futures = [submit(image) for image in images]
+        batched = [future.result(timeout=30) for future in futures]
+
+        for image, result in zip(images, batched):
+            np.testing.assert_allclose(
+                result, run_onnx_inference(image), rtol=0, atol=1e-5
+            )
+
+    @unittest.skipUnless(hasattr(os, "fork"), "fork not available")
+    def test_worker_serves_requests_after_fork(self):
+        # A pre-forking server loads the app (and the model) in the parent
+        warm_up()
+        start_worker()
+        width, height = settings.TARGET_IMAGE_SIZE
+        image = np.zeros((1, height, width, 3), np.float32)
+
+        pid = os.fork()
+        if pid == 0:
+            try:
+                submit(image).result(timeout=5)
+                os._exit(0)
+            except BaseException:
+                os._exit(1)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+
+    def test_invalid_shape_is_reported_through_the_future(self):
+        future = submit(np.zeros((1, 100, 100, 3), np.float32))
+        with self.assertRaises(ValueError):
+            future.result(timeout=30)
+
+
+JPEG_HEADER = b"\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01"
+PNG_HEADER = b"\x89PNG\r\n\x1a\n\x00\x00\x00\x0d"
+WEBP_HEADER = b"RIFF\x24\x00\x00\x00WEBP"
+
+
+class SniffImageFormatTests(SimpleTestCase):
+    def test_recognizes_supported_formats(self):
+        self.assertEqual(sniff_image_format(JPEG_HEADER), "JPEG")
+        self.assertEqual(sniff_image_format(PNG_HEADER), "PNG")
+        self.assertEqual(sniff_image_format(WEBP_HEADER), "WEBP")
+
+    def test_rejects_unknown_headers(self):
+        self.assertIsNone(sniff_image_format(b"GIF89a\x01\x00\x01\x00\x00\x00"))
+        self.assertIsNone(sniff_image_format(b"RIFF\x24\x00\x00\x00WAVE"))
+        self.assertIsNone(sniff_image_format(b""))
+
+
+class ImageUploadSerializerTests(SimpleTestCase):
+    def validate(self, header, content_type):
+        upload = SimpleUploadedFile("image", header + b"\x00" * 64, content_type)
+        return ImageUploadSerializer(data={"image": upload}).is_valid()
+
+    def test_accepts_matching_content_type(self):
+        self.assertTrue(self.validate(JPEG_HEADER, "image/jpeg"))
+        self.assertTrue(self.validate(JPEG_HEADER, "image/jpg"))
+        self.assertTrue(self.validate(PNG_HEADER, "image/png"))
+        self.assertTrue(self.validate(WEBP_HEADER, "image/webp"))
+
+    def test_rejects_content_type_mismatch(self):
+        self.assertFalse(self.validate(JPEG_HEADER, "image/png"))
+        self.assertFalse(self.validate(PNG_HEADER, "application/octet-stream"))
+
+    def test_rejects_bad_header(self):
+        self.assertFalse(self.validate(b"not an image", "image/jpeg"))
+
+
+class ToProbabilitiesTests(SimpleTestCase):
+    def test_softmax_output_is_unchanged(self):
+        predictions = np.array([0.7, 0.1, 0.05, 0.05, 0.04, 0.03, 0.03], np.float32)
+        np.testing.assert_allclose(
+            _to_probabilities(predictions), predictions, atol=1e-6
+        )
+
+    def test_quantized_output_is_renormalized(self):
+        # An INT8 model's softmax output can drift slightly away from summing to 1
+        predictions = np.array([0.68, 0.1, 0.05, 0.05, 0.04, 0.03, 0.03], np.float32)
+        probabilities = _to_probabilities(predictions)
+        self.assertAlmostEqual(float(probabilities.sum()), 1.0, places=6)
+        np.testing.assert_allclose(probabilities, predictions / 0.98, atol=1e-6)
+
+    def test_logits_go_through_softmax(self):
+        logits = np.array([[2.0, -1.0, 0.5, 0.0, 3.0, -2.0, 1.0]], np.float32)
+        expected = np.exp(logits[0]) / np.exp(logits[0]).sum()
+        probabilities = _to_probabilities(logits)
+        self.assertEqual(probabilities.shape, (7,))
+        np.testing.assert_allclose(probabilities, expected, atol=1e-6)
+        self.assertEqual(int(np.argmax(probabilities)), 4)
+
+
+class ArchiveImageTests(SimpleTestCase):
+    def encode(self, pixels, orientation):
+        image = Image.fromarray(pixels)
+        exif = image.getexif()
+        exif[0x0112] = orientation
+        buffer = io.BytesIO()
+        image.save(buffer, "PNG", exif=exif)
+        return buffer.getvalue()
+
+    def test_archive_copy_follows_exif_orientation(self):
+        pixels = np.random.default_rng(0).integers(0, 256, (30, 50, 3), np.uint8)
+        for orientation in range(1, 9):
+            data = self.encode(pixels, orientation)
+            *_, archive_image = decode_and_preprocess(
+                io.BytesIO(data), (224, 224), archive_max_size=1024
+            )
+            expected = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+            np.testing.assert_array_equal(archive_image, np.asarray(expected))
+
+    def test_archive_copy_is_downsized(self):
+        pixels = np.zeros((300, 400, 3), np.uint8)
+        *_, archive_image = decode_and_preprocess(
+            io.BytesIO(self.encode(pixels, 6)), (224, 224), archive_max_size=100
+        )
+        self.assertEqual(archive_image.shape, (100, 75, 3))
+
+
+class DiscardImageUploadTests(SimpleTestCase):
+    def test_pending_upload_is_cancelled(self):
+        future = Future()
+        with mock.patch("potato_classifier.tasks.uploader.destroy") as destroy:
+            discard_image_upload(future)
+        self.assertTrue(future.cancelled())
+        destroy.assert_not_called()
+
+    def test_finished_upload_is_deleted(self):
+        future = Future()
+        future.set_running_or_notify_cancel()
+        future.set_result(mock.Mock(public_id="potato_classifications/orphan"))
+        deleted = threading.Event()
+        with mock.patch(
+            "potato_classifier.tasks.uploader.destroy",
+            side_effect=lambda *args, **kwargs: deleted.set(),
+        ) as destroy:
+            discard_image_upload(future)
+            self.assertTrue(deleted.wait(timeout=5))
+        self.assertEqual(destroy.call_args.args, ("potato_classifications/orphan",))
+
+
+def create_classification(**kwargs):
+    fields = {
+        "predicted_class": "Healthy",
+        "confidence": 0.9,
+        "all_predictions": {"Healthy": 0.9},
+        "recommendations": [],
+    }
+    fields.update(kwargs)
+    return ImageClassification.objects.create(**fields)
+
+
+class HistoryCachingTests(TestCase):
+    url = reverse("classification-history")
+
+    def etag(self):
+        return self.client.get(self.url).headers["ETag"]
+
+    def test_matching_etag_returns_not_modified(self):
+        create_classification()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag())
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_changes_when_a_row_is_added(self):
+        create_classification()
+        before = self.etag()
+        create_classification()
+        self.assertNotEqual(self.etag(), before)
+
+    def test_etag_changes_when_a_row_is_deleted(self):
+        create_classification()
+        newest = create_classification()
+        before = self.etag()
+        newest.delete()
+        self.assertNotEqual(self.etag(), before)
+
+    def test_etag_changes_when_an_image_is_attached(self):
+        classification = create_classification()
+        before = self.etag()
+
+        upload = Future()
+        upload.set_result(
+            CloudinaryResource(
+                "potato_classifications/pid", format="jpg", resource_type="image"
+            )
+        )
+        # Keep the test transaction's connection open
+        with mock.patch("potato_classifier.tasks.connection"):
+            _attach_image(classification.id, upload)
+
+        classification.refresh_from_db()
+        self.assertTrue(classification.image)
+        self.assertNotEqual(self.etag(), before)
+
+
+class DetailCachingTests(TestCase):
+    def get(self, classification):
+        return self.client.get(
+            reverse("classification-detail", args=[classification.id])
+        )
+
+    def test_pending_image_is_not_cached(self):
+        response = self.get(create_classification())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["Cache-Control"], "no-cache")
+
+    def test_attached_image_is_cached_as_immutable(self):
+        classification = create_classification()
+        pending_etag = self.get(classification).headers["ETag"]
+
+        ImageClassification.objects.filter(id=classification.id).update(
+            image="image/upload/v1/potato_classifications/pid.jpg"
+        )
+        response = self.get(classification)
+        self.assertEqual(
+            response.headers["Cache-Control"], "public, max-age=86400, immutable"
+        )
+        self.assertNotEqual(response.headers["ETag"], pending_etag)
+
+
+@override_settings(MODEL_PATH=__file__)
+class ClassifyImageViewTests(TestCase):
+    url = reverse("classify-image")
+
+    def classify(self, query=""):
+        buffer = io.BytesIO()
+        Image.new("RGB", (64, 48)).save(buffer, "PNG")
+        upload = SimpleUploadedFile("leaf.png", buffer.getvalue(), "image/png")
+
+        prediction = Future()
+        prediction.set_result(
+            np.array([0.05, 0.05, 0.05, 0.05, 0.05, 0.05, 0.7], np.float32)
+        )
+        with mock.patch(
+            "potato_classifier.views.submit", return_value=prediction
+        ), mock.patch(
+            "potato_classifier.views.start_image_upload", return_value=Future()
+        ):
+            response = self.client.post(self.url + query, {"image": upload})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_summary_returns_only_the_summary_fields(self):
+        data = self.classify("?summary=true")
+        self.assertEqual(
+            set(data),
+            {
+                "id",
+                "predicted_class",
+                "confidence",
+                "confidence_percentage",
+                "detail_url",
+            },
+        )
+        self.assertEqual(data["predicted_class"], "Healthy")
+
+    def test_full_response_includes_detail_url(self):
+        data = self.classify()
+        self.assertEqual(
+            set(data),
+            {
+                "id",
+                "predicted_class",
+                "confidence",
+                "confidence_percentage",
+                "all_predictions",
+                "recommendations",
+                "is_preprocessed",
+                "processing_time",
+                "image_url",
+                "detail_url",
+                "message",
+            },
+        )
+
+    def test_detail_url_points_at_the_saved_classification(self):
+        data = self.classify("?summary=true")
+        response = self.client.get(data["detail_url"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["id"], data["id"])
+        self.assertEqual(response.json()["predicted_class"], "Healthy")
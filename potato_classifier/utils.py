@@ -1,8 +1,10 @@
+import cv2
 import numpy as np
 import onnxruntime as ort
 from PIL import Image
 import io
 import os
+import threading
 import time
 from django.conf import settings
 
@@ -69,85 +71,284 @@ DISEASE_RECOMMENDATIONS = {
 }
 
 
-def check_if_preprocessed(image_file):
+_INV_255 = np.float32(1.0 / 255.0)
+
+
+def _normalize_to_float32(src, dst=None):
+    """Cast uint8 pixels to float32 in [0, 1] with a single pass over memory"""
+    if dst is None:
+        dst = np.empty(src.shape, np.float32)
+    np.multiply(src, _INV_255, out=dst)
+    return dst
+
+
+_THREAD_BUFFERS = threading.local()
+
+
+def _get_thread_buffers(target_size):
     """
-    Check if image appears to be preprocessed
-    This is a simple heuristic - you can make it more sophisticated
+    Return this thread's preallocated (resize, input tensor) buffers for target_size.
+    Reusing them avoids allocating a fresh input tensor on every request.
     """
-    try:
-        img = Image.open(image_file)
-        # Reset file pointer
-        image_file.seek(0)
+    width, height = target_size
+    buffers = getattr(_THREAD_BUFFERS, "buffers", None)
+    if buffers is None or buffers[0].shape != (height, width, 3):
+        buffers = (
+            np.empty((height, width, 3), np.uint8),
+            np.empty((1, height, width, 3), np.float32),
+        )
+        _THREAD_BUFFERS.buffers = buffers
+    return buffers
 
-        # Check if image is already the target size
-        if img.size == settings.TARGET_IMAGE_SIZE:
-            return True
 
-        # Check if image appears to be normalized (values between 0-1)
-        img_array = np.array(img)
-        if img_array.max() <= 1.0 and img_array.min() >= 0.0:
-            return True
+def _decode_image(data):
+    """
+    Decode raw image bytes to an RGB uint8 array.
+    OpenCV is used for speed; PIL handles any format OpenCV can't decode.
+    """
+    bgr = cv2.imdecode(
+        np.frombuffer(data, np.uint8),
+        cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION,
+    )
+    if bgr is not None:
+        return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+    return np.asarray(Image.open(io.BytesIO(data)).convert("RGB"))
+
+
+_EXIF_ORIENTATION_TAG = 0x0112
 
-        return False
+
+def _read_exif_orientation(data):
+    """
+    Return the EXIF orientation (1-8) of an encoded image, or 1 if it has none.
+    PIL only parses the header here; the pixels are never decoded.
+    """
+    try:
+        return Image.open(io.BytesIO(data)).getexif().get(_EXIF_ORIENTATION_TAG, 1)
     except Exception:
-        return False
+        return 1
+
 
+def _apply_exif_orientation(rgb, orientation):
+    """Rotate/flip pixels so they display upright, as a viewer honouring EXIF would"""
+    if orientation == 2:
+        return cv2.flip(rgb, 1)
+    if orientation == 3:
+        return cv2.rotate(rgb, cv2.ROTATE_180)
+    if orientation == 4:
+        return cv2.flip(rgb, 0)
+    if orientation == 5:
+        return cv2.transpose(rgb)
+    if orientation == 6:
+        return cv2.rotate(rgb, cv2.ROTATE_90_CLOCKWISE)
+    if orientation == 7:
+        return cv2.rotate(cv2.transpose(rgb), cv2.ROTATE_180)
+    if orientation == 8:
+        return cv2.rotate(rgb, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    return rgb
 
-def preprocess_image(image_file, target_size=(224, 224)):
-    """Load and preprocess image identical to training pipeline"""
+
+def make_archive_image(rgb, orientation=1, max_size=1024):
+    """
+    Downsize a decoded RGB image to at most max_size on its longest side and
+    turn it upright according to its EXIF orientation, for archiving.
+    """
+    height, width = rgb.shape[:2]
+    scale = max_size / max(height, width)
+    if scale < 1:
+        rgb = cv2.resize(
+            rgb,
+            (max(1, round(width * scale)), max(1, round(height * scale))),
+            interpolation=cv2.INTER_AREA,
+        )
+    return _apply_exif_orientation(rgb, orientation)
+
+
+def decode_and_preprocess(image_file, target_size=(224, 224), archive_max_size=None):
+    """
+    Decode an uploaded image once and preprocess it identical to the training pipeline.
+    An image already at the target size is treated as preprocessed and is not resized.
+    The returned tensor is a per-thread buffer that the next call on the same
+    thread overwrites. When archive_max_size is given, a downsized, upright copy
+    of the decoded image is returned as well so it can be stored without
+    decoding the upload again; otherwise that element is None.
+    """
     try:
         start_time = time.time()
-        img = Image.open(image_file).convert("RGB")
-        original_size = f"{img.size[0]}x{img.size[1]}"
-        img = img.resize(target_size)
-        img_array = np.array(img).astype(np.float32) / 255.0
+        image_file.seek(0)
+        data = image_file.read()
+        image_file.seek(0)
+        rgb = _decode_image(data)
+        original_size = f"{rgb.shape[1]}x{rgb.shape[0]}"
+
+        resize_buffer, img_array = _get_thread_buffers(target_size)
+
+        # Check if image is already the target size
+        is_preprocessed = (rgb.shape[1], rgb.shape[0]) == tuple(target_size)
+        if is_preprocessed:
+            resized = rgb
+        else:
+            resized = cv2.resize(
+                rgb, target_size, dst=resize_buffer, interpolation=cv2.INTER_AREA
+            )
+
+        # Write straight into the batch slot of the input tensor
+        _normalize_to_float32(resized, dst=img_array[0])
+
+        # The model sees the pixels as stored (matching training); only the
+        # archived copy is rotated, since re-encoding drops the EXIF tag
+        archive_image = None
+        if archive_max_size is not None:
+            archive_image = make_archive_image(
+                rgb, _read_exif_orientation(data), archive_max_size
+            )
+
         processing_time = time.time() - start_time
         return (
-            np.expand_dims(img_array, axis=0),
+            img_array,
             original_size,
+            is_preprocessed,
             processing_time,
-        )  # Add batch dimension
+            archive_image,
+        )
     except Exception as e:
         raise ValueError(f"Error preprocessing image: {str(e)}")
 
 
-def run_onnx_inference(image_array):
-    """Run inference using ONNX Runtime"""
-    try:
-        # Create ONNX inference session
-        session = ort.InferenceSession(
-            settings.MODEL_PATH, providers=["CPUExecutionProvider"]
-        )
+def encode_archive_jpeg(rgb, quality=85):
+    """Encode an RGB image as JPEG for archiving instead of the original upload"""
+    ok, buffer = cv2.imencode(
+        ".jpg",
+        cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR),
+        [cv2.IMWRITE_JPEG_QUALITY, quality],
+    )
+    if not ok:
+        raise ValueError("Error encoding archive image")
+    return buffer.tobytes()
+
+
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+
+def _get_execution_providers():
+    """
+    Pick execution providers in order of preference, skipping any that this
+    onnxruntime build doesn't ship. CPUExecutionProvider is always the fallback.
+    """
+    provider_options = {
+        "OpenVINOExecutionProvider": {
+            "device_type": "CPU",
+            "precision": "FP32",
+            "num_of_threads": str(settings.ONNX_INTRA_OP_THREADS),
+        },
+        "DnnlExecutionProvider": {},
+        "CPUExecutionProvider": {},
+    }
+    available = ort.get_available_providers()
+    providers = [
+        name
+        for name in settings.ONNX_EXECUTION_PROVIDERS
+        if name in available and name != "CPUExecutionProvider"
+    ]
+    providers.append("CPUExecutionProvider")
+    return providers, [provider_options.get(name, {}) for name in providers]
+
+
+def get_session():
+    """
+    Return the shared ONNX Runtime session, creating it on first use.
+    Building a session parses the model and runs graph optimizations, so it
+    is done once per process and reused across requests.
+    """
+    global _SESSION
+    if _SESSION is None:
+        with _SESSION_LOCK:
+            if _SESSION is None:
+                so = ort.SessionOptions()
+                so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                so.intra_op_num_threads = settings.ONNX_INTRA_OP_THREADS
+                so.inter_op_num_threads = 1
+                so.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+                providers, provider_options = _get_execution_providers()
+                # Load by path and let ORT read the file itself. Passing an
+                # mmap'd buffer from Python copies it into a bytes object anyway,
+                # and "session.use_ort_model_bytes_for_initializers" is unsafe
+                # from Python because ORT doesn't own that copy.
+                session = ort.InferenceSession(
+                    settings.MODEL_PATH,
+                    sess_options=so,
+                    providers=providers,
+                    provider_options=provider_options,
+                )
+
+                # Cache input/output details on the session
+                input_meta = session.get_inputs()[0]
+                session.input_name = input_meta.name
+                session.input_shape = input_meta.shape
+                # Resolve symbolic dimensions to None once, not on every request
+                session.resolved_shape = tuple(
+                    None if isinstance(dim, str) else dim for dim in input_meta.shape
+                )
+                session.output_names = [o.name for o in session.get_outputs()]
+                print(f"🔍 Model Input Name: {session.input_name}")
+                print(f"📐 Expected Shape: {session.input_shape}")
+                print(f"⚙️ Execution Providers: {session.get_providers()}")
+
+                _SESSION = session
+    return _SESSION
 
-        # Extract input details
-        input_meta = session.get_inputs()[0]
-        input_name = input_meta.name
-        expected_shape = input_meta.shape
-        print(f"🔍 Model Input Name: {input_name}")
-        print(f"📐 Expected Shape: {expected_shape}")
 
-        # Resolve symbolic dimensions to None
-        resolved_shape = [
-            None if isinstance(dim, str) else dim for dim in expected_shape
-        ]
+def warm_up_session():
+    """Load the session and run one dummy inference so the first request is fast"""
+    session = get_session()
+    shape = [1 if dim is None else dim for dim in session.resolved_shape]
+    session.run(session.output_names, {session.input_name: np.zeros(shape, np.float32)})
 
-        # Validate shape: ensure dimensions match, except symbolic ones
-        if len(image_array.shape) != len(resolved_shape):
+
+def validate_input_shape(session, image_array):
+    """Check an input array against the model's input shape"""
+    resolved_shape = session.resolved_shape
+    if image_array.shape == resolved_shape:
+        return
+
+    # Validate shape: ensure dimensions match, except symbolic ones
+    if len(image_array.shape) != len(resolved_shape):
+        raise ValueError(
+            f"Dimension mismatch. Expected {len(resolved_shape)}D, got {len(image_array.shape)}D"
+        )
+
+    for i, (actual_dim, expected_dim) in enumerate(
+        zip(image_array.shape, resolved_shape)
+    ):
+        if expected_dim is not None and actual_dim != expected_dim:
             raise ValueError(
-                f"Dimension mismatch. Expected {len(resolved_shape)}D, got {len(image_array.shape)}D"
+                f"Shape mismatch at dimension {i}: expected {expected_dim}, got {actual_dim}"
             )
 
-        for i, (actual_dim, expected_dim) in enumerate(
-            zip(image_array.shape, resolved_shape)
-        ):
-            if expected_dim is not None and actual_dim != expected_dim:
-                raise ValueError(
-                    f"Shape mismatch at dimension {i}: expected {expected_dim}, got {actual_dim}"
-                )
+
+def run_batch_inference(batch):
+    """Run inference on a stacked (N, H, W, C) batch and return (N, classes)"""
+    session = get_session()
+
+    # Bind the float32 input in place so ORT reads the numpy buffer directly
+    io_binding = session.io_binding()
+    io_binding.bind_cpu_input(
+        session.input_name, np.ascontiguousarray(batch, dtype=np.float32)
+    )
+    io_binding.bind_output(session.output_names[0])
+    session.run_with_iobinding(io_binding)
+    return io_binding.copy_outputs_to_cpu()[0]
+
+
+def run_onnx_inference(image_array):
+    """Run inference using ONNX Runtime"""
+    try:
+        validate_input_shape(get_session(), image_array)
 
         # Run ONNX inference
-        output = session.run(None, {input_name: image_array.astype(np.float32)})
-        return np.squeeze(output[0])  # Remove batch dimension if needed
+        output = run_batch_inference(image_array)
+        return np.squeeze(output)  # Remove batch dimension if needed
 
     except Exception as e:
         raise ValueError(f"❌ Error during ONNX inference: {str(e)}")
@@ -159,17 +360,34 @@ def run_tflite_inference(image_array):
     return run_onnx_inference(image_array)
 
 
+def _to_probabilities(predictions):
+    """
+    Return predictions as a probability vector that sums to 1.
+    The bundled model already ends in a Softmax, so its output (or a quantized
+    model's slightly-off output) is only rescaled; raw logits from other exports
+    go through a numerically stable softmax.
+    """
+    predictions = np.asarray(predictions, dtype=np.float32).ravel()
+    total = float(predictions.sum())
+    if predictions.min() >= 0.0 and abs(total - 1.0) < 0.05:
+        return predictions / np.float32(total)
+
+    e = np.exp(predictions - predictions.max())
+    return e / e.sum()
+
+
 def get_classification_results(predictions):
     """Process predictions and return formatted results"""
+    # Convert to Python floats in one call instead of boxing each element
+    probs = _to_probabilities(predictions).tolist()
+
     # Get the predicted class (highest probability)
-    predicted_class_idx = np.argmax(predictions)
+    predicted_class_idx = max(range(len(probs)), key=probs.__getitem__)
     predicted_class = CLASS_NAMES[predicted_class_idx]
-    confidence = float(predictions[predicted_class_idx])
+    confidence = probs[predicted_class_idx]
 
     # Format all predictions
-    all_predictions = {}
-    for i, class_name in enumerate(CLASS_NAMES):
-        all_predictions[class_name] = float(predictions[i])
+    all_predictions = dict(zip(CLASS_NAMES, probs))
 
     # Get recommendations for the predicted class
     recommendations = DISEASE_RECOMMENDATIONS.get(
@@ -3,10 +3,16 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.conf import settings
+from django.db.models import Count, Max
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import etag
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
+import hashlib
 import os
 import time
 import math
@@ -14,15 +20,45 @@ import math
 from .models import ImageClassification
 from .serializers import (
     ImageClassificationSerializer,
+    ImageClassificationListSerializer,
     ImageUploadSerializer,
     ClassificationResultSerializer,
 )
 from .utils import (
-    check_if_preprocessed,
-    preprocess_image,
-    run_onnx_inference,
+    decode_and_preprocess,
     get_classification_results,
 )
+from .inference_worker import submit
+from .tasks import (
+    attach_image_when_uploaded,
+    discard_image_upload,
+    start_image_upload,
+)
+
+
+def history_etag(request, *args, **kwargs):
+    """
+    ETag for the history list: changes when a classification is added or
+    removed, or when a background image upload completes
+    """
+    # MAX(updated_at) is read from its index; updated_at also moves when an image is attached
+    state = ImageClassification.objects.aggregate(
+        latest=Max("updated_at"), total=Count("id")
+    )
+    key = f"{state['latest']}|{state['total']}"
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def classification_etag(request, classification_id, *args, **kwargs):
+    """ETag for a classification: only its image changes after it is created"""
+    images = list(
+        ImageClassification.objects.filter(id=classification_id).values_list(
+            "image", flat=True
+        )[:1]
+    )
+    if not images:
+        return None
+    return hashlib.md5(f"{classification_id}|{images[0]}".encode()).hexdigest()
 
 
 class StandardResultsSetPagination(PageNumberPagination):
@@ -74,7 +110,7 @@ class ClassifyImageView(APIView):
         2. ML model inference using ONNX Runtime
         3. Disease classification with confidence scores
         4. Generate 5 specific treatment recommendations
-        5. Store results with Cloudinary image hosting
+        5. Store results; the image is uploaded to Cloudinary in the background
         
         **Supported Disease Classes:**
         - Bacteria
@@ -89,7 +125,20 @@ class ClassifyImageView(APIView):
         - Format: JPEG, PNG, WebP
         - Max size: 10MB
         - Recommended: Clear, well-lit potato plant images
+        
+        **Summary responses:**
+        Pass `summary=true` to get only the top prediction and a `detail_url`.
+        The full results (all predictions, recommendations, image URL) can be
+        fetched from `detail_url` when needed.
         """,
+        manual_parameters=[
+            openapi.Parameter(
+                "summary",
+                openapi.IN_QUERY,
+                description="Return only the predicted class, confidence and detail URL.",
+                type=openapi.TYPE_BOOLEAN,
+            ),
+        ],
         request_body=ImageUploadSerializer,
         responses={
             200: openapi.Response(
@@ -119,7 +168,8 @@ class ClassifyImageView(APIView):
                         ],
                         "is_preprocessed": False,
                         "processing_time": 1.23,
-                        "image_url": "https://res.cloudinary.com/your-cloud/image/upload/v1234567890/potato_classifications/sample.jpg",
+                        "image_url": None,
+                        "detail_url": "https://api.example.com/api/classification/123e4567-e89b-12d3-a456-426614174000/",
                         "message": "Image classified successfully",
                     }
                 },
@@ -151,6 +201,7 @@ class ClassifyImageView(APIView):
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+        upload_future = None
         try:
             start_time = time.time()
             image_file = serializer.validated_data["image"]
@@ -164,16 +215,28 @@ class ClassifyImageView(APIView):
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 )
 
-            # Step 1: Check if image is preprocessed
-            is_preprocessed = check_if_preprocessed(image_file)
+            # Step 1-2: Decode once, check if preprocessed and preprocess if needed
+            (
+                preprocessed_image,
+                original_size,
+                is_preprocessed,
+                preprocess_time,
+                archive_image,
+            ) = decode_and_preprocess(
+                image_file,
+                settings.TARGET_IMAGE_SIZE,
+                archive_max_size=settings.ARCHIVE_IMAGE_MAX_SIZE,
+            )
 
-            # Step 2: Preprocess if needed
-            preprocessed_image, original_size, preprocess_time = preprocess_image(
-                image_file, settings.TARGET_IMAGE_SIZE
+            # The model instance assigns its id up front, so the Cloudinary
+            # upload can run on another thread while inference runs here
+            classification = ImageClassification(
+                is_preprocessed=is_preprocessed, image_size=original_size
             )
+            upload_future = start_image_upload(classification.id, archive_image)
 
-            # Step 3: Run inference
-            predictions = run_onnx_inference(preprocessed_image)
+            # Step 3: Run inference (batched with concurrent requests)
+            predictions = submit(preprocessed_image).result()
 
             # Step 4: Get classification results and recommendations
             results = get_classification_results(predictions)
@@ -181,19 +244,32 @@ class ClassifyImageView(APIView):
             # Calculate total processing time
             total_processing_time = time.time() - start_time
 
-            # Step 5: Save to database with Cloudinary storage
-            classification = ImageClassification.objects.create(
-                image=image_file,
-                predicted_class=results["predicted_class"],
-                confidence=results["confidence"],
-                all_predictions=results["all_predictions"],
-                recommendations=results["recommendations"],
-                is_preprocessed=is_preprocessed,
-                processing_time=total_processing_time,
-                image_size=original_size,
-            )
+            # Step 5: Save to database; the image is attached once its upload finishes
+            classification.predicted_class = results["predicted_class"]
+            classification.confidence = results["confidence"]
+            classification.all_predictions = results["all_predictions"]
+            classification.recommendations = results["recommendations"]
+            classification.processing_time = total_processing_time
+            classification.save(force_insert=True)
+            attach_image_when_uploaded(classification.id, upload_future)
+            upload_future = None
 
             # Step 6: Return response
+            detail_url = request.build_absolute_uri(
+                reverse("classification-detail", args=[classification.id])
+            )
+            if request.query_params.get("summary", "").lower() in ("1", "true"):
+                return Response(
+                    {
+                        "id": classification.id,
+                        "predicted_class": results["predicted_class"],
+                        "confidence": results["confidence"],
+                        "confidence_percentage": classification.confidence_percentage,
+                        "detail_url": detail_url,
+                    },
+                    status=status.HTTP_200_OK,
+                )
+
             response_data = {
                 "id": classification.id,
                 "predicted_class": results["predicted_class"],
@@ -204,14 +280,18 @@ class ClassifyImageView(APIView):
                 "is_preprocessed": is_preprocessed,
                 "processing_time": round(total_processing_time, 2),
                 "image_url": classification.image_url,
+                "detail_url": detail_url,
                 "message": "Image classified successfully",
             }
 
             return Response(response_data, status=status.HTTP_200_OK)
 
         except ValueError as e:
+            # Nothing was saved, so don't leave the upload behind
+            discard_image_upload(upload_future)
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
+            discard_image_upload(upload_future)
             return Response(
                 {"error": f"An unexpected error occurred: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -236,9 +316,11 @@ class ClassificationHistoryView(APIView):
         - Classification ID and timestamp
         - Predicted disease class and confidence score
         - Cloudinary image URLs
-        - Treatment recommendations
         - Processing metadata
         
+        Per-class predictions and treatment recommendations are only returned
+        by the classification details endpoint.
+        
         Results are ordered by creation date (newest first) and include
         pagination metadata.
         """,
@@ -259,14 +341,25 @@ class ClassificationHistoryView(APIView):
         responses={
             200: openapi.Response(
                 description="Classification history retrieved successfully",
-                schema=ImageClassificationSerializer(many=True),
+                schema=ImageClassificationListSerializer(many=True),
             )
         },
         tags=["History"],
     )
+    @method_decorator(etag(history_etag))
     def get(self, request):
-        # Get all classification objects, ordered by creation date (newest first)
-        classifications = ImageClassification.objects.all().order_by("-created_at")
+        # Get classification objects, ordered by creation date (newest first).
+        # The large JSON columns are only needed by the detail view.
+        classifications = ImageClassification.objects.only(
+            "id",
+            "image",
+            "predicted_class",
+            "confidence",
+            "is_preprocessed",
+            "processing_time",
+            "image_size",
+            "created_at",
+        ).order_by("-created_at")
 
         # Instantiate the custom paginator and paginate the queryset
         paginator = self.pagination_class()
@@ -275,7 +368,9 @@ class ClassificationHistoryView(APIView):
         )
 
         # Serialize the paginated data
-        serializer = ImageClassificationSerializer(paginated_classifications, many=True)
+        serializer = ImageClassificationListSerializer(
+            paginated_classifications, many=True
+        )
 
         # Return the paginated response using your custom method
         return paginator.get_paginated_response(serializer.data)
@@ -312,11 +407,21 @@ class ClassificationDetailView(APIView):
         },
         tags=["History"],
     )
+    @method_decorator(etag(classification_etag))
     def get(self, request, classification_id):
         try:
             classification = ImageClassification.objects.get(id=classification_id)
             serializer = ImageClassificationSerializer(classification)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            response = Response(serializer.data, status=status.HTTP_200_OK)
+
+            # Classifications never change once their image upload has finished
+            if classification.image:
+                patch_cache_control(
+                    response, public=True, max_age=86400, immutable=True
+                )
+            else:
+                patch_cache_control(response, no_cache=True)
+            return response
         except ImageClassification.DoesNotExist:
             return Response(
                 {"error": "Classification not found"}, status=status.HTTP_404_NOT_FOUND
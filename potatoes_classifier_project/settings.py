@@ -12,7 +12,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 import os
-from decouple import config
+from decouple import Csv, config
 import cloudinary
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -159,9 +159,42 @@ MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
 # Model configuration
-MODEL_PATH = os.path.join(BASE_DIR, "models", "potato_disease_float16.onnx")
+MODEL_PATH = config(
+    "MODEL_PATH",
+    default=os.path.join(BASE_DIR, "models", "potato_disease_float16.onnx"),
+)
+# Default output of `manage.py optimize_model`; only served if MODEL_PATH points here
+QUANTIZED_MODEL_PATH = os.path.join(BASE_DIR, "models", "potato_disease_int8.onnx")
 TARGET_IMAGE_SIZE = (224, 224)
 
+# ONNX Runtime execution providers, most preferred first. Providers missing from
+# the installed onnxruntime build (e.g. OpenVINO needs onnxruntime-openvino) are
+# skipped, and CPUExecutionProvider is always kept as the fallback.
+ONNX_EXECUTION_PROVIDERS = config(
+    "ONNX_EXECUTION_PROVIDERS",
+    default="OpenVINOExecutionProvider,DnnlExecutionProvider,CPUExecutionProvider",
+    cast=Csv(),
+)
+
+# ONNX Runtime threading. Each web server worker process gets its own session,
+# so cores are split between WEB_CONCURRENCY processes (the worker count Gunicorn
+# also reads) instead of every process spinning up one thread per core.
+WEB_CONCURRENCY = config("WEB_CONCURRENCY", default=1, cast=int)
+ONNX_INTRA_OP_THREADS = config(
+    "ONNX_INTRA_OP_THREADS",
+    default=max(1, (os.cpu_count() or 1) // max(1, WEB_CONCURRENCY)),
+    cast=int,
+)
+
+# Micro-batching of concurrent inference requests
+INFERENCE_MAX_BATCH_SIZE = config("INFERENCE_MAX_BATCH_SIZE", default=16, cast=int)
+
+# Threads used to upload classified images to Cloudinary after responding
+IMAGE_UPLOAD_WORKERS = config("IMAGE_UPLOAD_WORKERS", default=4, cast=int)
+# Classified images are archived as JPEGs at most this many pixels on the long side
+ARCHIVE_IMAGE_MAX_SIZE = config("ARCHIVE_IMAGE_MAX_SIZE", default=1024, cast=int)
+ARCHIVE_IMAGE_QUALITY = config("ARCHIVE_IMAGE_QUALITY", default=85, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "potatoes_classifier_project.settings")
 
 application = get_wsgi_application()
+
+# Load the ONNX model before the first request is served
+from potato_classifier.inference_worker import warm_up  # noqa: E402
+
+warm_up()